@@ -0,0 +1,139 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+import numpy as np
+from sqlalchemy import func, cast, type_coerce, Integer
+from sqlalchemy.orm import Session
+import models
+import cache_sync
+import datetime_utils
+
+WEEKDAY_NAMES = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+# Heatmaps for ranges that ended before today are not expected to change
+# (slots are booked for today and later), so they are cached; writes that
+# do touch a cached range drop it through cache_sync.
+HEATMAP_CACHE_SIZE = 256
+_heatmap_cache = OrderedDict()
+_heatmap_cache_lock = threading.Lock()
+
+def _days_per_weekday(date_from: datetime.date, date_to: datetime.date) -> np.ndarray:
+    """Number of occurrences of each weekday (Monday=0) in [date_from, date_to]."""
+    days = np.arange(np.datetime64(date_from, "D"), np.datetime64(date_to, "D") + 1)
+    # 1970-01-01 was a Thursday (weekday 3)
+    weekdays = (days.astype(np.int64) + 3) % 7
+    return np.bincount(weekdays, minlength=7)
+
+def _query_counts(db: Session, date_from: datetime.date, date_to: datetime.date,
+                  department_id: Optional[int]):
+    start, _ = datetime_utils.get_date_range_bounds(date_from)
+    _, end = datetime_utils.get_date_range_bounds(date_to)
+
+    # time_slot is stored as minutes since 1970-01-01 (a Thursday)
+    minutes = type_coerce(models.Appointment.time_slot, Integer)
+    day_number = cast(minutes / datetime_utils.MINUTES_PER_DAY, Integer)
+    weekday = (day_number + 3) % 7
+    slot = minutes % datetime_utils.MINUTES_PER_DAY
+    query = db.query(
+        models.Appointment.department_id,
+        weekday,
+        slot,
+        func.count(models.Appointment.id),
+    ).filter(
+        models.Appointment.time_slot >= start,
+        models.Appointment.time_slot < end,
+    )
+    if department_id is not None:
+        query = query.filter(models.Appointment.department_id == department_id)
+    return query.group_by(models.Appointment.department_id, weekday, slot).all()
+
+def _compute_heatmap(db: Session, date_from: datetime.date, date_to: datetime.date,
+                     department_id: Optional[int]) -> dict:
+    departments_query = db.query(models.Department).order_by(models.Department.id.asc())
+    if department_id is not None:
+        departments_query = departments_query.filter(models.Department.id == department_id)
+    departments = departments_query.all()
+
+    grid = datetime_utils.get_working_slots_for_date(date_from)
+    slots = [slot.strftime("%H:%M") for slot in grid]
+    slot_index = {slot.hour * 60 + slot.minute: i for i, slot in enumerate(grid)}
+    department_index = {dept.id: i for i, dept in enumerate(departments)}
+
+    rows = [
+        (department_index[dept_id], weekday, slot_index[slot], count)
+        for dept_id, weekday, slot, count in _query_counts(db, date_from, date_to, department_id)
+        # Skip rows outside the current slot grid or for unknown departments
+        if dept_id in department_index and slot in slot_index
+    ]
+
+    counts = np.zeros((len(departments), 7, len(slots)), dtype=np.int64)
+    if rows:
+        dept_idx, weekday_idx, slot_idx, values = np.array(rows, dtype=np.int64).T
+        np.add.at(counts, (dept_idx, weekday_idx, slot_idx), values)
+
+    # Every department offers each slot once per day
+    capacity = _days_per_weekday(date_from, date_to)
+    occupancy = np.divide(
+        counts * 100.0,
+        capacity[None, :, None],
+        out=np.zeros(counts.shape, dtype=np.float64),
+        where=capacity[None, :, None] > 0,
+    )
+    totals = counts.sum(axis=(1, 2))
+    total_capacity = capacity.sum() * len(slots)
+    load = totals * 100.0 / total_capacity if total_capacity else np.zeros(len(departments))
+
+    return {
+        "date_from": datetime_utils.format_date(date_from),
+        "date_to": datetime_utils.format_date(date_to),
+        "weekdays": WEEKDAY_NAMES,
+        "slots": slots,
+        "departments": [
+            {
+                "department_id": dept.id,
+                "department_name": dept.name,
+                "total_appointments": int(totals[i]),
+                "load_percentage": round(float(load[i]), 1),
+                "heatmap": np.round(occupancy[i], 1).tolist(),
+            }
+            for i, dept in enumerate(departments)
+        ],
+    }
+
+def invalidate_day(department_id: Optional[int], day: Optional[datetime.date]):
+    """Drop cached heatmaps whose range contains `day` (all of them if None)."""
+    with _heatmap_cache_lock:
+        for key in list(_heatmap_cache):
+            date_from, date_to, cached_department_id = key
+            if day is not None and not (date_from <= day <= date_to):
+                continue
+            if department_id is not None and cached_department_id not in (None, department_id):
+                continue
+            del _heatmap_cache[key]
+
+cache_sync.register(invalidate_day)
+
+def get_load_heatmap(db: Session, date_from: datetime.date, date_to: datetime.date,
+                     department_id: Optional[int] = None) -> dict:
+    """
+    Occupancy (percent of slots booked) per department, weekday and slot
+    for the inclusive range [date_from, date_to].
+    """
+    cacheable = date_to < datetime.now().date()
+    key = (date_from, date_to, department_id)
+    if cacheable:
+        with _heatmap_cache_lock:
+            result = _heatmap_cache.get(key)
+            if result is not None:
+                _heatmap_cache.move_to_end(key)
+                return result
+
+    result = _compute_heatmap(db, date_from, date_to, department_id)
+
+    if cacheable:
+        with _heatmap_cache_lock:
+            _heatmap_cache[key] = result
+            if len(_heatmap_cache) > HEATMAP_CACHE_SIZE:
+                _heatmap_cache.popitem(last=False)
+    return result
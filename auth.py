@@ -1,28 +1,125 @@
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from config import settings
+from database import SessionLocal
+import models
+import cache_sync
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
+    now = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+        expire = now + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    # "gen" ties the token to the current revocation generation (see revoke_all_tokens);
+    # "jti" keeps tokens issued in the same second distinct, so logout revokes only one
+    with SessionLocal() as db:
+        generation = _get_generation(db)
+    to_encode.update({"exp": expire, "iat": now, "gen": generation, "jti": secrets.token_hex(8)})
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
 
+# --- Verified-token cache ---
+# Decoding and checking the HMAC on every admin request is wasted work for
+# dashboards that poll with the same token, so verified tokens are cached
+# (by SHA-256 digest, never the raw token) until they expire. Revocations
+# are stored in the database (revoked_tokens, auth_state) and checked on
+# every cache miss; cache hits check this worker's copy, and revocations
+# made by any worker clear every worker's cache through cache_sync.
+_lock = threading.Lock()
+_verified = OrderedDict()  # digest -> (username, exp, gen)
+_revoked = {}  # digest -> exp, revocations seen by this worker
+_generation = 0  # Last known generation; tokens with an older "gen" claim are rejected
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _prune_revoked(now: float):
+    for digest in [digest for digest, exp in _revoked.items() if exp <= now]:
+        del _revoked[digest]
+
+def _get_generation(db) -> int:
+    state = db.get(models.AuthState, 1)
+    return state.token_generation if state is not None else 0
+
+def _clear_verified(department_id=None, day=None):
+    """cache_sync listener: a token was revoked somewhere, re-check on next use."""
+    with _lock:
+        _verified.clear()
+
+def revoke_token(token: str):
+    """Reject this token from now on, in every worker (logout)."""
+    digest = _digest(token)
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        return
+    now = time.time()
+    if exp is None:
+        exp = now + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+    with SessionLocal() as db:
+        # Rows are only needed until the token would have expired anyway
+        db.query(models.RevokedToken).filter(
+            models.RevokedToken.expires_at < datetime.now()
+        ).delete(synchronize_session=False)
+        db.merge(models.RevokedToken(digest=digest, expires_at=datetime.fromtimestamp(exp)))
+        invalidation = cache_sync.record_write(db, scope=cache_sync.AUTH)
+        db.commit()
+        cache_sync.notify_committed(invalidation)
+
+    with _lock:
+        _prune_revoked(now)
+        _revoked[digest] = exp
+
+def revoke_all_tokens():
+    """Reject every token issued so far, in every worker (e.g. after changing the admin password)."""
+    global _generation
+    with SessionLocal() as db:
+        updated = db.query(models.AuthState).filter(models.AuthState.id == 1).update(
+            {"token_generation": models.AuthState.token_generation + 1}, synchronize_session=False
+        )
+        if not updated:
+            db.add(models.AuthState(id=1, token_generation=1))
+        invalidation = cache_sync.record_write(db, scope=cache_sync.AUTH)
+        db.commit()
+        generation = _get_generation(db)
+        cache_sync.notify_committed(invalidation)
+
+    with _lock:
+        _generation = max(_generation, generation)
+
 def verify_token(token: str = Depends(oauth2_scheme)):
+    global _generation
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    digest = _digest(token)
+    now = time.time()
+    with _lock:
+        if digest in _revoked:
+            raise credentials_exception
+        cached = _verified.get(digest)
+        if cached is not None:
+            username, exp, gen = cached
+            if exp > now and gen >= _generation:
+                _verified.move_to_end(digest)
+                return username
+            del _verified[digest]
+
     try:
         payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
         username: str = payload.get("sub")
@@ -32,7 +129,29 @@ def verify_token(token: str = Depends(oauth2_scheme)):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+
+    # Cache miss: check the shared revocation state
+    exp = payload.get("exp")
+    gen = payload.get("gen", 0)
+    with SessionLocal() as db:
+        generation = _get_generation(db)
+        revoked = db.get(models.RevokedToken, digest) is not None
+
+    with _lock:
+        _generation = max(_generation, generation)
+        if revoked:
+            _revoked[digest] = exp if exp is not None else now + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+            raise credentials_exception
+        if gen < _generation:
+            raise credentials_exception
+        if exp is not None:
+            _verified[digest] = (username, exp, gen)
+            _verified.move_to_end(digest)
+            while len(_verified) > settings.TOKEN_CACHE_SIZE:
+                _verified.popitem(last=False)
     return username
 
 def get_current_admin(token: str = Depends(oauth2_scheme)):
-    return verify_token(token)
\ No newline at end of file
+    return verify_token(token)
+
+cache_sync.register(_clear_verified, scope=cache_sync.AUTH)
\ No newline at end of file
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+import models
+from database import engine, SQLALCHEMY_DATABASE_URL
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Callbacks invoked as listener(department_id, day) for every write in
+# their scope; None means the write may affect all departments / all days.
+# DATA covers departments and appointments, AUTH token revocations.
+DATA = "data"
+AUTH = "auth"
+_listeners: dict[str, list[Callable[[Optional[int], Optional[datetime.date]], None]]] = {DATA: [], AUTH: []}
+
+_lock = threading.Lock()  # Guards _generation / _last_seen_id / _applied_ids (never held during I/O)
+_version_connection: Optional[sqlite3.Connection] = None
+_fetch_connection: Optional[sqlite3.Connection] = None
+_data_version: Optional[int] = None
+_generation: Optional[str] = None  # cache_sync_state.generation the ids below belong to
+_last_seen_id: Optional[int] = None
+_applied_ids: set[int] = set()  # Local writes that were already applied
+_next_check = 0.0
+_fetching = False
+_prune_task: Optional[asyncio.Task] = None
+PRUNE_INTERVAL_SECONDS = 600
+
+def _database_path() -> Optional[str]:
+    """The SQLite file to watch, or None when polling isn't possible/needed."""
+    url = make_url(SQLALCHEMY_DATABASE_URL)
+    if (url.get_backend_name() != "sqlite" or not url.database
+            or ":memory:" in url.database or "mode=memory" in str(url)):
+        return None
+    return url.database
+
+def _connect(timeout: float) -> sqlite3.Connection:
+    # Dedicated connections outside the SQLAlchemy pools, so polling never
+    # takes a connection away from bookings. Autocommit mode: reads never
+    # leave a transaction (and its lock) open.
+    return sqlite3.connect(_DATABASE_PATH, timeout=timeout, check_same_thread=False,
+                           isolation_level=None, uri=_DATABASE_PATH.startswith("file:"))
+
+_DATABASE_PATH = _database_path()
+
+def register(listener: Callable[[Optional[int], Optional[datetime.date]], None], scope: str = DATA):
+    _listeners[scope].append(listener)
+
+def _apply(scope: Optional[str], department_id: Optional[int], day: Optional[datetime.date]):
+    """Run the listeners of `scope` (of every scope if None)."""
+    if scope is None:
+        listeners = [listener for scope_listeners in _listeners.values() for listener in scope_listeners]
+    else:
+        listeners = _listeners[scope]
+    for listener in listeners:
+        try:
+            listener(department_id, day)
+        except Exception:
+            logger.exception("Cache invalidation listener failed")
+
+def record_write(db: Session, department_id: Optional[int] = None,
+                 day: Optional[datetime.date] = None, scope: str = DATA) -> models.CacheInvalidation:
+    """
+    Log a write in the caller's transaction, so other workers see it exactly
+    when the data is committed. Call notify_committed() after commit.
+    """
+    invalidation = models.CacheInvalidation(scope=scope, department_id=department_id, day=day)
+    db.add(invalidation)
+    return invalidation
+
+def notify_committed(invalidation: models.CacheInvalidation):
+    """Apply a committed write to this worker's caches right away."""
+    with _lock:
+        # The poller may already have passed this row (and applied it)
+        if _last_seen_id is None or invalidation.id > _last_seen_id:
+            _applied_ids.add(invalidation.id)
+    _apply(invalidation.scope, invalidation.department_id, invalidation.day)
+
+def _current_generation(connection: sqlite3.Connection) -> str:
+    row = connection.execute("SELECT generation FROM cache_sync_state WHERE id = 1").fetchone()
+    if row is None:
+        # First start, or the tables were dropped and recreated (mock-data.py)
+        connection.execute("INSERT OR IGNORE INTO cache_sync_state (id, generation) VALUES (1, ?)",
+                           (uuid.uuid4().hex,))
+        row = connection.execute("SELECT generation FROM cache_sync_state WHERE id = 1").fetchone()
+    return row[0]
+
+def _fetch_new_rows() -> list[tuple[Optional[str], Optional[int], Optional[str]]]:
+    """Read invalidation rows newer than the last seen one (runs in a thread)."""
+    global _fetch_connection, _generation, _last_seen_id
+    if _fetch_connection is None:
+        _fetch_connection = _connect(timeout=1)
+    generation = _current_generation(_fetch_connection)
+    if generation != _generation:
+        max_id = _fetch_connection.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations").fetchone()[0]
+        with _lock:
+            first_poll = _generation is None
+            _generation = generation
+            _last_seen_id = max_id
+            _applied_ids.clear()
+        if first_poll:
+            return []
+        # The tables were recreated and ids started over: treat it as a write
+        # to everything and follow the new ids
+        return [(None, None, None)]
+
+    rows = _fetch_connection.execute(
+        "SELECT id, scope, department_id, day FROM cache_invalidations WHERE id > ? ORDER BY id",
+        (_last_seen_id,),
+    ).fetchall()
+    pending = []
+    with _lock:
+        for row_id, scope, department_id, day in rows:
+            if row_id in _applied_ids:
+                _applied_ids.discard(row_id)
+            else:
+                pending.append((scope or DATA, department_id, day))
+            _last_seen_id = row_id
+    return pending
+
+async def poll():
+    """
+    Apply writes made by other workers since the last call. Runs before
+    every request: it is throttled, and on the event loop it only costs a
+    single non-blocking PRAGMA. New rows are read in a worker thread.
+    """
+    global _version_connection, _data_version, _next_check, _fetching
+    now = time.monotonic()
+    if now < _next_check or _fetching or _DATABASE_PATH is None:
+        return
+    _next_check = now + settings.CACHE_SYNC_INTERVAL_SECONDS
+
+    try:
+        if _version_connection is None:
+            # timeout=0: if the file is locked, skip this check instead of waiting
+            _version_connection = _connect(timeout=0)
+        version = _version_connection.execute("PRAGMA data_version").fetchone()[0]
+    except sqlite3.Error:
+        return
+    if version == _data_version:
+        return
+
+    _fetching = True
+    try:
+        pending = await asyncio.get_running_loop().run_in_executor(None, _fetch_new_rows)
+    except Exception:
+        logger.exception("Cache sync poll failed")
+        return
+    finally:
+        _fetching = False
+    _data_version = version
+
+    for scope, department_id, day in pending:
+        if day is not None:
+            day = datetime.strptime(day, "%Y-%m-%d").date()
+        _apply(scope, department_id, day)
+
+def _prune():
+    cutoff = datetime.now() - timedelta(seconds=settings.CACHE_SYNC_RETENTION_SECONDS)
+    with engine.begin() as connection:
+        connection.execute(
+            models.CacheInvalidation.__table__.delete().where(models.CacheInvalidation.created_at < cutoff)
+        )
+
+async def _prune_periodically():
+    # Off the request path: the DELETE may have to wait for a booking's write lock
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(PRUNE_INTERVAL_SECONDS)
+        try:
+            await loop.run_in_executor(None, _prune)
+        except Exception:
+            logger.exception("Failed to prune cache invalidations")
+
+async def start():
+    global _prune_task
+    if _prune_task is None and _DATABASE_PATH is not None:
+        _prune_task = asyncio.create_task(_prune_periodically())
+
+async def stop():
+    global _prune_task
+    if _prune_task is not None:
+        _prune_task.cancel()
+        await asyncio.gather(_prune_task, return_exceptions=True)
+        _prune_task = None
@@ -1,15 +1,25 @@
 from pydantic_settings import BaseSettings
 from datetime import datetime, time
-from typing import Dict, ClassVar, Any
+from typing import Dict, ClassVar, Any, Optional
 
 class Settings(BaseSettings):
     # Database settings
     DATABASE_URL: str = "sqlite:///./tson-queue.db"
+    # Admin analytics/exports read through a separate engine: a replica URL
+    # if set, otherwise a read-only connection to DATABASE_URL (SQLite)
+    READ_DATABASE_URL: Optional[str] = None
+    SQLITE_WAL: bool = True  # Lets readers run while a booking is being written
+    DB_WRITE_POOL_SIZE: int = 5
+    DB_WRITE_MAX_OVERFLOW: int = 5
+    DB_READ_POOL_SIZE: int = 2
+    DB_READ_MAX_OVERFLOW: int = 2
+    DB_POOL_TIMEOUT: int = 10  # Seconds to wait for a free pooled connection
     
     # JWT settings
     JWT_SECRET_KEY: str = "your-secret-key-here"  # In production, use environment variable
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    TOKEN_CACHE_SIZE: int = 1024  # Verified tokens kept in memory (per worker)
     
     # Business hours
     OPENING_TIME: time = time(9, 0)  # 9:00 AM
@@ -26,6 +36,41 @@ class Settings(BaseSettings):
         "end": 18    # 6 PM (exclusive)
     }
     SLOT_DURATION_MINUTES: int = 30
+    BOOKED_SLOTS_MAX_DAYS: int = 31  # Max date range for /appointments/{id}/available/
+    
+    # Admission control for the booking routes (per client IP)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BOOKING_PER_MINUTE: int = 10
+    RATE_LIMIT_BOOKING_BURST: int = 5
+    RATE_LIMIT_SLOTS_PER_MINUTE: int = 60
+    RATE_LIMIT_SLOTS_BURST: int = 20
+    RATE_LIMIT_MAX_CLIENTS: int = 100000  # Upper bound on tracked client buckets
+    RATE_LIMIT_IDLE_SECONDS: int = 600  # Buckets idle this long are dropped
+    RATE_LIMIT_TRUST_FORWARDED: bool = False  # Use X-Forwarded-For behind a proxy
+    RATE_LIMIT_PROXY_HOPS: int = 1  # Trusted proxies appending to X-Forwarded-For
+    BOOKING_MAX_CONCURRENCY: int = 8  # Simultaneous POST /appointments/ requests
+    
+    # Idempotency-Key support for POST /appointments/
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 60 * 60
+    IDEMPOTENCY_MAX_KEYS: int = 10000
+    
+    # Booking confirmations (sent in the background from the outbox table)
+    # Off by default: enable only with a real gateway plugged in through
+    # notifications.set_transport(); "log"/"file" are for development
+    NOTIFICATIONS_ENABLED: bool = False
+    NOTIFICATION_TRANSPORT: str = "log"  # "log" or "file"
+    NOTIFICATION_FILE_PATH: str = "notifications.log"
+    NOTIFICATION_WORKERS: int = 1
+    NOTIFICATION_BATCH_SIZE: int = 50
+    NOTIFICATION_BATCH_WAIT_SECONDS: float = 0.5  # How long to wait to fill a batch
+    NOTIFICATION_MAX_ATTEMPTS: int = 5
+    NOTIFICATION_RETRY_BASE_SECONDS: float = 5  # Doubled after every failed attempt
+    NOTIFICATION_LEASE_SECONDS: int = 60  # Claimed jobs are retried if not finished in time
+    NOTIFICATION_POLL_SECONDS: int = 30  # Outbox rescan for jobs left by restarts
+    
+    # Cache invalidation across worker processes
+    CACHE_SYNC_INTERVAL_SECONDS: float = 0.05  # Min time between checks for writes from other workers
+    CACHE_SYNC_RETENTION_SECONDS: int = 3600  # How long invalidation rows are kept
     
     class Config:
         env_file = ".env"
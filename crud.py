@@ -1,22 +1,83 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import extract, func
+from sqlalchemy.orm import Session, joinedload
+import sqlalchemy.exc
+from sqlalchemy import extract, func, select, bindparam, type_coerce, Integer
 from datetime import datetime, timedelta, time
+from typing import Optional
 import models, schemas
 import datetime_utils
+import notifications
+import cache_sync
 from config import settings
 
+# --- Prebuilt statements for the hot paths ---
+# Built once at import with bound parameters, so each call skips Query
+# construction and hits SQLAlchemy's compiled-statement cache. They select
+# plain columns, returning lightweight rows instead of identity-mapped objects.
+_department_by_id = select(
+    models.Department.id,
+    models.Department.name,
+    models.Department.address,
+    models.Department.is_special
+).where(models.Department.id == bindparam("department_id"))
+
+_booked_time_slots = select(models.Appointment.time_slot).where(
+    models.Appointment.department_id == bindparam("department_id"),
+    models.Appointment.time_slot >= bindparam("start_time"),
+    models.Appointment.time_slot < bindparam("end_time")
+)
+
+# Same filter, but returns the raw integer encoding for bitmask building
+_booked_slot_minutes = select(type_coerce(models.Appointment.time_slot, Integer)).where(
+    models.Appointment.department_id == bindparam("department_id"),
+    models.Appointment.time_slot >= bindparam("start_time"),
+    models.Appointment.time_slot < bindparam("end_time")
+)
+
+_slot_taken = select(models.Appointment.id).where(
+    models.Appointment.department_id == bindparam("department_id"),
+    models.Appointment.time_slot == bindparam("time_slot")
+).limit(1)
+
 def get_departments(db: Session):
     return db.query(models.Department).all()
 
 def get_department_by_id(db: Session, department_id: int):
-    return db.query(models.Department).filter(models.Department.id == department_id).first()
+    """Read-only row with id, name, address and is_special (None if not found)."""
+    return db.execute(_department_by_id, {"department_id": department_id}).first()
 
-def get_booked_slots(db: Session, department_id: int):
-    return db.query(models.Appointment).filter(
-        models.Appointment.department_id == department_id
-    ).all()
+def _get_booked_time_slots(db: Session, department_id: int, start_time: datetime, end_time: datetime) -> list[datetime]:
+    return db.execute(_booked_time_slots, {
+        "department_id": department_id,
+        "start_time": start_time,
+        "end_time": end_time,
+    }).scalars().all()
 
-def create_appointment(db: Session, appointment: schemas.AppointmentCreate):
+def is_slot_booked(db: Session, department_id: int, time_slot: datetime) -> bool:
+    return db.execute(_slot_taken, {"department_id": department_id, "time_slot": time_slot}).first() is not None
+
+def get_booked_slots(db: Session, department_id: int, date_from: datetime.date, date_to: datetime.date) -> dict:
+    """
+    Booked slots per day in [date_from, date_to] as bitmasks over the working
+    slot grid (bit i set = slot i booked). Only time_slot is selected, so the
+    query is answered from the (department_id, time_slot) unique index.
+    """
+    start_time, _ = datetime_utils.get_date_range_bounds(date_from)
+    _, end_time = datetime_utils.get_date_range_bounds(date_to)
+
+    booked = {date_from + timedelta(days=i): 0 for i in range((date_to - date_from).days + 1)}
+    rows = db.execute(_booked_slot_minutes, {
+        "department_id": department_id,
+        "start_time": start_time,
+        "end_time": end_time,
+    }).scalars()
+    for minutes in rows:
+        day, index = datetime_utils.get_slot_position(minutes)
+        if index >= 0:
+            booked[day] |= 1 << index
+    return booked
+
+def create_appointment(db: Session, appointment: schemas.AppointmentCreate,
+                       idempotency_key: Optional[str] = None, fingerprint: Optional[str] = None):
     # No timezone conversion needed - store as naive datetime
     db_appointment = models.Appointment(
         department_id=appointment.department_id,
@@ -27,8 +88,23 @@ def create_appointment(db: Session, appointment: schemas.AppointmentCreate):
         service=appointment.service
     )
     db.add(db_appointment)
+    # The confirmation is stored in the same transaction and sent in the background
+    outbox = notifications.add_booking_confirmation(db, db_appointment)
+    if idempotency_key is not None:
+        # Committed together with the booking, so a retry on any worker finds it
+        db.add(models.IdempotencyRecord(
+            key=idempotency_key,
+            fingerprint=fingerprint,
+            status_code=200,
+            appointment=db_appointment
+        ))
+    # Lets every worker drop cached data for this department and day
+    invalidation = cache_sync.record_write(db, appointment.department_id, appointment.time_slot.date())
     db.commit()
     db.refresh(db_appointment)
+    if outbox is not None:
+        notifications.enqueue(outbox.id)
+    cache_sync.notify_committed(invalidation)
     return db_appointment
 
 def get_appointment_by_id(db: Session, appointment_id: int):
@@ -39,6 +115,46 @@ def get_appointment_by_id(db: Session, appointment_id: int):
         appointment.department_address = appointment.department.address
     return appointment
 
+def get_upcoming_appointments_by_iin(db: Session, iin: str, phone_number: str):
+    # Served by the (iin, time_slot) index; the phone number must match too,
+    # so an IIN alone doesn't reveal anything
+    return db.query(models.Appointment).options(
+        joinedload(models.Appointment.department)
+    ).filter(
+        models.Appointment.iin == iin,
+        models.Appointment.time_slot >= datetime.now(),
+        models.Appointment.phone_number == phone_number,
+        models.Appointment.status == "active"
+    ).order_by(models.Appointment.time_slot.asc()).all()
+
+# --- Idempotency keys ---
+def get_idempotency_record(db: Session, key: str) -> Optional[models.IdempotencyRecord]:
+    return db.query(models.IdempotencyRecord).filter(models.IdempotencyRecord.key == key).first()
+
+def save_idempotency_error(db: Session, key: str, fingerprint: str,
+                           status_code: int, detail: str) -> models.IdempotencyRecord:
+    """Store an error as the key's result; returns the existing record if another request won."""
+    record = models.IdempotencyRecord(
+        key=key,
+        fingerprint=fingerprint,
+        status_code=status_code,
+        error_detail=detail
+    )
+    db.add(record)
+    try:
+        db.commit()
+    except sqlalchemy.exc.IntegrityError:
+        db.rollback()
+        return get_idempotency_record(db, key)
+    return record
+
+def delete_expired_idempotency_records(db: Session, older_than: datetime) -> int:
+    deleted = db.query(models.IdempotencyRecord).filter(
+        models.IdempotencyRecord.created_at < older_than
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
 # --- Logic for Available Slots ---
 def get_available_slots(db: Session, department_id: int, target_date: datetime.date):
     # 1. Define all possible slots for the target date within working hours
@@ -47,23 +163,11 @@ def get_available_slots(db: Session, department_id: int, target_date: datetime.d
     # 2. Get booked slots for that department and date
     start_time, end_time = datetime_utils.get_date_range_bounds(target_date)
     
-    # Get all appointments for this department and date
-    booked_appointments = db.query(models.Appointment).filter(
-        models.Appointment.department_id == department_id,
-        models.Appointment.time_slot >= start_time,
-        models.Appointment.time_slot < end_time
-    ).all()
-    
-    # Create a list of booked datetime objects
-    booked_slots = [appt.time_slot for appt in booked_appointments]
+    # Get the booked times for this department and date
+    booked_slots = set(_get_booked_time_slots(db, department_id, start_time, end_time))
     
     # Make a clean list of available slots by checking each possible slot
-    available_slots = []
-    for slot in all_possible_slots:
-        if slot not in booked_slots:
-            available_slots.append(slot)
-    
-    return available_slots
+    return [slot for slot in all_possible_slots if slot not in booked_slots]
 
 # --- Service List Logic ---
 REGULAR_TSON_SERVICES = [
@@ -93,7 +197,18 @@ def get_services_for_department(db: Session, department_id: int) -> list[str]:
     department = get_department_by_id(db, department_id)
     if not department:
         return [] # Or raise HTTPException if preferred
+    return get_services_for(department)
+
+def is_special_service(service: str) -> Optional[bool]:
+    """Whether a service is offered by special departments (None if unknown)."""
+    if service in SPECIAL_TSON_SERVICES:
+        return True
+    if service in REGULAR_TSON_SERVICES:
+        return False
+    return None
 
+def get_services_for(department) -> list[str]:
+    """Services for an already fetched department (model or row)."""
     if department.is_special:
         return SPECIAL_TSON_SERVICES
     else:
@@ -1,14 +1,107 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from config import settings
+
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _is_sqlite_memory(url: str) -> bool:
+    # sqlite://, sqlite:///:memory: and file::memory:?uri=true style URLs
+    database = make_url(url).database
+    return _is_sqlite(url) and (not database or ":memory:" in database or "mode=memory" in url)
+
+def _sqlite_read_only_url(url: str) -> str:
+    """sqlite:///./db.sqlite -> sqlite:///file:./db.sqlite?mode=ro&uri=true"""
+    return f"sqlite:///file:{make_url(url).database}?mode=ro&uri=true"
+
+def _create_engine(url: str, pool_size: int, max_overflow: int):
+    kwargs = {}
+    if _is_sqlite(url):
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if _is_sqlite_memory(url):
+        # Every new connection would be a new, empty database, so keep
+        # SQLAlchemy's default single-connection pool for in-memory SQLite
+        return create_engine(url, **kwargs)
+    return create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        **kwargs
+    )
+
+# Write engine: bookings and everything else on the latency-critical path
+engine = _create_engine(SQLALCHEMY_DATABASE_URL, settings.DB_WRITE_POOL_SIZE, settings.DB_WRITE_MAX_OVERFLOW)
+
+# Read engine: admin analytics and exports, with its own (smaller) pool so
+# heavy reads can't take connections away from bookings
+if settings.READ_DATABASE_URL:
+    SQLALCHEMY_READ_DATABASE_URL = settings.READ_DATABASE_URL
+elif _is_sqlite_memory(SQLALCHEMY_DATABASE_URL):
+    # A second engine would open a separate, empty in-memory database
+    SQLALCHEMY_READ_DATABASE_URL = None
+elif _is_sqlite(SQLALCHEMY_DATABASE_URL):
+    SQLALCHEMY_READ_DATABASE_URL = _sqlite_read_only_url(SQLALCHEMY_DATABASE_URL)
+else:
+    SQLALCHEMY_READ_DATABASE_URL = SQLALCHEMY_DATABASE_URL
+
+if SQLALCHEMY_READ_DATABASE_URL is None:
+    read_engine = engine
+else:
+    read_engine = _create_engine(SQLALCHEMY_READ_DATABASE_URL, settings.DB_READ_POOL_SIZE, settings.DB_READ_MAX_OVERFLOW)
+
+if _is_sqlite(SQLALCHEMY_DATABASE_URL) and not _is_sqlite_memory(SQLALCHEMY_DATABASE_URL):
+    @event.listens_for(engine, "connect")
+    def _configure_write_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if settings.SQLITE_WAL:
+            # In WAL mode readers don't block the writer (and vice versa)
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
+if SQLALCHEMY_READ_DATABASE_URL is not None and _is_sqlite(SQLALCHEMY_READ_DATABASE_URL):
+    @event.listens_for(read_engine, "connect")
+    def _configure_read_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./tson-queue.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
+def init_db():
+    """
+    Create missing tables, migrate old schemas and add missing indexes.
+    Called from the application startup hook (not at import time), so
+    importing the app stays cheap.
+    """
+    import models  # noqa: F401 - registers the models on Base.metadata
+    import migrations
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+    # create_all skips tables that already exist, so add indexes introduced later
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
 def get_db():
     db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db():
+    """Session for heavy read-only queries (admin statistics, exports)."""
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
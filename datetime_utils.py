@@ -1,9 +1,14 @@
 from datetime import datetime, time, timedelta
+import pytz
 from config import settings
 
 # We'll use these functions consistently throughout the application
 # to avoid timezone confusion
 
+# Slots are stored as whole minutes since this (naive, local) epoch
+SLOT_EPOCH = datetime(1970, 1, 1)
+MINUTES_PER_DAY = 24 * 60
+
 def parse_datetime(date_str: str) -> datetime:
     """
     Parse an ISO-format datetime string (assumed to be in local time) 
@@ -13,6 +18,17 @@ def parse_datetime(date_str: str) -> datetime:
     """
     return datetime.fromisoformat(date_str)
 
+def to_local_naive(dt: datetime) -> datetime:
+    """
+    Convert an offset-aware datetime to naive local time (settings.TIMEZONE_NAME).
+    Naive datetimes are assumed to be local already and returned unchanged.
+    
+    Example: "2026-10-19T10:00:00+00:00" -> datetime(2026, 10, 19, 15, 0, 0)
+    """
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(pytz.timezone(settings.TIMEZONE_NAME)).replace(tzinfo=None)
+
 def parse_date(date_str: str) -> datetime.date:
     """
     Parse a date string in YYYY-MM-DD format into a date object.
@@ -52,6 +68,36 @@ def get_working_slots_for_date(target_date: datetime.date) -> list[datetime]:
         
     return slots
 
+def to_slot_minutes(dt: datetime) -> int:
+    """
+    Encode a naive datetime as minutes since SLOT_EPOCH (seconds are dropped).
+
+    Example: datetime(2025, 4, 29, 11, 0) -> 29098740
+    """
+    return (dt - SLOT_EPOCH) // timedelta(minutes=1)
+
+def from_slot_minutes(minutes: int) -> datetime:
+    """
+    Decode minutes since SLOT_EPOCH back into a naive datetime.
+    """
+    return SLOT_EPOCH + timedelta(minutes=minutes)
+
+def get_slot_position(minutes: int) -> tuple[datetime.date, int]:
+    """
+    Split an encoded slot into its date and its position in that day's
+    working slot grid (0 for the first slot, -1 if it isn't on the grid).
+    """
+    day_number, minute_of_day = divmod(minutes, MINUTES_PER_DAY)
+    day = (SLOT_EPOCH + timedelta(days=day_number)).date()
+
+    # Same 30-minute grid as get_working_slots_for_date
+    interval_minutes = 30
+    offset = minute_of_day - settings.WORKING_HOURS["start"] * 60
+    slot_count = (settings.WORKING_HOURS["end"] - settings.WORKING_HOURS["start"]) * 60 // interval_minutes
+    if offset < 0 or offset % interval_minutes or offset // interval_minutes >= slot_count:
+        return day, -1
+    return day, offset // interval_minutes
+
 def get_date_range_bounds(target_date: datetime.date) -> tuple[datetime, datetime]:
     """
     Get the start and end datetime bounds for a specific date.
@@ -74,6 +120,10 @@ def is_valid_working_hour(dt: datetime) -> bool:
     hour = dt.hour
     minute = dt.minute
     
+    # Slots start on a whole minute (slot times are stored without seconds)
+    if dt.second or dt.microsecond:
+        return False
+    
     # Check if hour is within working hours
     if not (settings.WORKING_HOURS["start"] <= hour < settings.WORKING_HOURS["end"]):
         return False
@@ -0,0 +1,118 @@
+import heapq
+import math
+import threading
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.orm import Session
+import models
+import cache_sync
+
+EARTH_RADIUS_KM = 6371.0
+
+def _to_unit_vector(latitude: float, longitude: float) -> tuple[float, float, float]:
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+def _chord_to_km(chord: float) -> float:
+    # Straight-line distance between unit vectors -> great-circle distance
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+class KDTree:
+    """
+    3-d tree over points on the unit sphere. Euclidean (chord) distance is
+    monotonic in great-circle distance, so nearest-neighbour search in 3-d
+    gives exact geographic results without special cases at the poles or
+    the antimeridian.
+    """
+
+    def __init__(self, items: list[tuple[tuple[float, float, float], object]]):
+        self.root = self._build(items, 0)
+
+    def _build(self, items, depth):
+        if not items:
+            return None
+        axis = depth % 3
+        items = sorted(items, key=lambda item: item[0][axis])
+        median = len(items) // 2
+        point, value = items[median]
+        return (point, value, axis,
+                self._build(items[:median], depth + 1),
+                self._build(items[median + 1:], depth + 1))
+
+    def nearest(self, target: tuple[float, float, float], k: int, accept=None) -> list[tuple[float, object]]:
+        """Up to k (chord_distance, value) pairs closest to target, nearest first."""
+        heap = []  # Max-heap via negated squared distances, holds the best k so far
+        counter = 0  # Tie-breaker so values are never compared
+
+        def visit(node):
+            nonlocal counter
+            if node is None:
+                return
+            point, value, axis, left, right = node
+            dist_sq = sum((a - b) ** 2 for a, b in zip(point, target))
+            if accept is None or accept(value):
+                counter += 1
+                if len(heap) < k:
+                    heapq.heappush(heap, (-dist_sq, counter, value))
+                elif dist_sq < -heap[0][0]:
+                    heapq.heapreplace(heap, (-dist_sq, counter, value))
+
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if len(heap) < k or diff * diff < -heap[0][0]:
+                visit(far)
+
+        if k > 0:
+            visit(self.root)
+        return [(math.sqrt(-neg_dist_sq), value) for neg_dist_sq, _, value in sorted(heap, reverse=True)]
+
+# --- Department index ---
+_tree: Optional[KDTree] = None
+_lock = threading.Lock()
+
+def invalidate(department_id: Optional[int] = None, day: Optional[datetime.date] = None):
+    """
+    Drop the index on department changes (rebuilt on the next query).
+    Department writers record them with cache_sync.record_write(db), without a day.
+    """
+    global _tree
+    if day is None:
+        _tree = None
+
+def _get_tree(db: Session) -> KDTree:
+    global _tree
+    tree = _tree
+    if tree is None:
+        with _lock:
+            if _tree is None:
+                rows = db.query(
+                    models.Department.id,
+                    models.Department.name,
+                    models.Department.address,
+                    models.Department.is_special,
+                    models.Department.latitude,
+                    models.Department.longitude,
+                ).filter(
+                    models.Department.latitude.isnot(None),
+                    models.Department.longitude.isnot(None)
+                ).all()
+                _tree = KDTree([(_to_unit_vector(row.latitude, row.longitude), row) for row in rows])
+            tree = _tree
+    return tree
+
+def find_nearest(db: Session, latitude: float, longitude: float, k: int,
+                 is_special: Optional[bool] = None) -> list[tuple[object, float]]:
+    """
+    The k departments closest to (latitude, longitude) as (row, distance_km)
+    pairs, nearest first. Departments without coordinates are skipped.
+    """
+    accept = None
+    if is_special is not None:
+        accept = lambda row: bool(row.is_special) == is_special
+    matches = _get_tree(db).nearest(_to_unit_vector(latitude, longitude), k, accept)
+    return [(row, _chord_to_km(chord)) for chord, row in matches]
+
+# Appointment writes always carry a day; department-level writes don't
+cache_sync.register(invalidate)
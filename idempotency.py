@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from datetime import datetime, timedelta
+from fastapi import HTTPException, status
+import models, schemas, crud
+from database import SessionLocal
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+PRUNE_INTERVAL_SECONDS = 600
+
+class KeyReuseError(HTTPException):
+    """The key was already used with a different request body."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key уже использован с другими данными",
+        )
+
+class StoredResult:
+    __slots__ = ("fingerprint", "expires_at", "status_code", "body")
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.status_code: Optional[int] = None  # None while the first request is still running
+        self.body: Any = None
+
+    def replay(self):
+        """Return the stored success body or re-raise the stored error."""
+        if self.status_code >= 400:
+            raise HTTPException(status_code=self.status_code, detail=self.body)
+        return self.body
+
+class IdempotencyStore:
+    """
+    Bounded TTL store of first results per Idempotency-Key.
+
+    Keys are kept in insertion order, so expired entries and the overflow
+    beyond `max_keys` are always at the front of the dict.
+    """
+
+    def __init__(self, ttl_seconds: int = settings.IDEMPOTENCY_TTL_SECONDS,
+                 max_keys: int = settings.IDEMPOTENCY_MAX_KEYS):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, fingerprint: str) -> Optional[StoredResult]:
+        """
+        Claim `key` for a new request. Returns the stored result if the key
+        was already completed; raises if it is in progress or was used with a
+        different payload; returns None if the caller should run the request.
+        """
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Слишком длинный Idempotency-Key")
+
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = StoredResult(fingerprint, now + self.ttl_seconds)
+                return None
+
+        if entry.fingerprint != fingerprint:
+            raise KeyReuseError()
+        if entry.status_code is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Запрос с этим Idempotency-Key уже обрабатывается",
+            )
+        return entry
+
+    def complete(self, key: str, status_code: int, body: Any):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.status_code = status_code
+                entry.body = body
+
+    def abandon(self, key: str):
+        """Forget a key whose request failed unexpectedly, so a retry can run it."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _evict(self, now: float):
+        entries = self._entries
+        while entries:
+            entry = next(iter(entries.values()))
+            if entry.expires_at > now and len(entries) < self.max_keys:
+                break
+            entries.popitem(last=False)
+
+# In-process front cache; the idempotency_keys table is the source of truth
+store = IdempotencyStore()
+
+def replay_record(record: models.IdempotencyRecord, fingerprint: str):
+    """Return the stored appointment or re-raise the stored error of a persisted key."""
+    if record.fingerprint != fingerprint:
+        raise KeyReuseError()
+    if record.appointment_id is not None:
+        return schemas.Appointment.model_validate(record.appointment)
+    raise HTTPException(status_code=record.status_code, detail=record.error_detail)
+
+def _prune():
+    db = SessionLocal()
+    try:
+        cutoff = datetime.now() - timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+        crud.delete_expired_idempotency_records(db, cutoff)
+    finally:
+        db.close()
+
+async def _prune_periodically():
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, _prune)
+        except Exception:
+            logger.exception("Failed to prune idempotency keys")
+        await asyncio.sleep(PRUNE_INTERVAL_SECONDS)
+
+_prune_task = None
+
+async def start():
+    global _prune_task
+    if _prune_task is None:
+        _prune_task = asyncio.create_task(_prune_periodically())
+
+async def stop():
+    global _prune_task
+    if _prune_task is not None:
+        _prune_task.cancel()
+        await asyncio.gather(_prune_task, return_exceptions=True)
+        _prune_task = None
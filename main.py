@@ -1,30 +1,34 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Header, Request
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta, date, time
 from fastapi.middleware.cors import CORSMiddleware
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from io import BytesIO
 from fastapi.responses import StreamingResponse
 from sqlalchemy import func
 from typing import Optional
+from contextlib import asynccontextmanager
 import sqlalchemy.exc
 
-import models, schemas, crud
-from database import engine, get_db
-from auth import create_access_token, get_current_admin
+import models, schemas, crud, rate_limit, idempotency, notifications, response_cache, cache_sync, geo_index
+from database import get_db, get_read_db, init_db
+from auth import create_access_token, get_current_admin, oauth2_scheme, revoke_token, revoke_all_tokens
 from config import settings
 from datetime import datetime, timedelta
 import datetime_utils
 
-models.Base.metadata.create_all(bind=engine)
+# Create tables and start background workers on startup instead of at import time
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    await notifications.start()
+    await cache_sync.start()
+    await idempotency.start()
+    yield
+    await idempotency.stop()
+    await cache_sync.stop()
+    await notifications.stop()
 
-app = FastAPI(title="ЦОН API", description="API для онлайн-записи в ЦОН")
+app = FastAPI(title="ЦОН API", description="API для онлайн-записи в ЦОН", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -35,36 +39,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Register the font before creating the PDF
-pdfmetrics.registerFont(TTFont('ArialUnicodeMS', 'fonts/ArialUnicodeMS.ttf'))
-# pdfmetrics.registerFont(TTFont('ArialUnicodeMS-Bold', 'fonts/ArialUnicodeMS-Bold.ttf'))
-
-# Create custom styles with Cyrillic support
-def get_custom_styles():
-    styles = getSampleStyleSheet()
-    # Create custom styles with Cyrillic font
-    styles.add(ParagraphStyle(
-        name='CustomTitle',
-        parent=styles['Title'],
-        fontName='ArialUnicodeMS',
-        fontSize=24,
-        spaceAfter=30
-    ))
-    styles.add(ParagraphStyle(
-        name='CustomHeading1',
-        parent=styles['Heading1'],
-        fontName='ArialUnicodeMS',
-        fontSize=18,
-        spaceAfter=20
-    ))
-    styles.add(ParagraphStyle(
-        name='CustomNormal',
-        parent=styles['Normal'],
-        fontName='ArialUnicodeMS',
-        fontSize=12,
-        spaceAfter=12
-    ))
-    return styles
+# Pick up writes made by other worker processes before serving cached data
+@app.middleware("http")
+async def sync_caches(request: Request, call_next):
+    await cache_sync.poll()
+    return await call_next(request)
 
 # Главная страница (просто заглушка для API)
 @app.get("/")
@@ -76,6 +55,36 @@ def read_root():
 def get_departments(db: Session = Depends(get_db)):
     return crud.get_departments(db) # crud function needs to return the model object
 
+# Ближайшие отделения к точке (k-d дерево в памяти, без обхода таблицы)
+@app.get("/departments/nearest/", response_model=list[schemas.DepartmentWithDistance])
+def get_nearest_departments(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=50, description="Number of departments to return"),
+    is_special: Optional[bool] = Query(None, description="Only special (true) or regular (false) departments"),
+    service: Optional[str] = Query(None, description="Only departments offering this service"),
+    db: Session = Depends(get_db)
+):
+    if service is not None:
+        # Services are determined by the department type
+        service_is_special = crud.is_special_service(service)
+        if service_is_special is None or (is_special is not None and is_special != service_is_special):
+            return []
+        is_special = service_is_special
+
+    return [
+        schemas.DepartmentWithDistance(
+            id=department.id,
+            name=department.name,
+            address=department.address,
+            is_special=department.is_special,
+            latitude=department.latitude,
+            longitude=department.longitude,
+            distance_km=round(distance_km, 2)
+        )
+        for department, distance_km in geo_index.find_nearest(db, latitude, longitude, k, is_special)
+    ]
+
 # Получить список услуг для отделения
 @app.get("/departments/{department_id}/services/", response_model=schemas.ServiceList)
 def get_department_services(department_id: int, db: Session = Depends(get_db)):
@@ -107,14 +116,69 @@ def get_appointment(appointment_id: int, db: Session = Depends(get_db)):
         department_address=appointment.department.address
     )
 
-# Получить свободные слоты для отделения
-@app.get("/appointments/{department_id}/available/", response_model=list[schemas.Appointment])
-def get_booked_slots(department_id: int, db: Session = Depends(get_db)):
-    slots = crud.get_booked_slots(db, department_id)
-    return slots
+# Найти предстоящие записи гражданина по ИИН и телефону
+# (POST, чтобы персональные данные не попадали в URL и логи)
+@app.post(
+    "/appointments/lookup/",
+    response_model=list[schemas.AppointmentResponse],
+    dependencies=[Depends(rate_limit.limit_available_slots)],
+)
+def lookup_appointments(lookup: schemas.AppointmentLookup, db: Session = Depends(get_db)):
+    appointments = crud.get_upcoming_appointments_by_iin(db, lookup.iin, lookup.phone_number)
+    return [
+        schemas.AppointmentResponse(
+            id=appointment.id,
+            department_id=appointment.department_id,
+            time_slot=appointment.time_slot,
+            user_name=appointment.user_name,
+            phone_number=appointment.phone_number,
+            iin=appointment.iin,
+            service=appointment.service,
+            department_name=appointment.department.name,
+            department_address=appointment.department.address
+        )
+        for appointment in appointments
+    ]
+
+# Получить занятые слоты отделения за период (битовая маска на каждый день)
+@app.get(
+    "/appointments/{department_id}/available/",
+    response_model=schemas.BookedSlots,
+    dependencies=[Depends(rate_limit.limit_available_slots)],
+)
+def get_booked_slots(
+    department_id: int,
+    date_from: str = Query(..., description="Start date (YYYY-MM-DD), inclusive"),
+    date_to: str = Query(..., description="End date (YYYY-MM-DD), inclusive"),
+    db: Session = Depends(get_db)
+):
+    try:
+        start_date = datetime_utils.parse_date(date_from)
+        end_date = datetime_utils.parse_date(date_to)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный формат даты. Используйте YYYY-MM-DD.")
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="Начальная дата должна быть не позже конечной.")
+    if (end_date - start_date).days >= settings.BOOKED_SLOTS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Период не может превышать {settings.BOOKED_SLOTS_MAX_DAYS} дней.")
+
+    department = crud.get_department_by_id(db, department_id)
+    if not department:
+        raise HTTPException(status_code=404, detail="Отделение не найдено")
+
+    booked = crud.get_booked_slots(db, department_id, start_date, end_date)
+    return schemas.BookedSlots(
+        department_id=department_id,
+        slots=[slot.strftime("%H:%M") for slot in datetime_utils.get_working_slots_for_date(start_date)],
+        booked={datetime_utils.format_date(day): mask for day, mask in booked.items()}
+    )
 
 # --- Updated Endpoint: Get AVAILABLE Slots ---
-@app.get("/departments/{department_id}/available_slots/", response_model=list[datetime])
+@app.get(
+    "/departments/{department_id}/available_slots/",
+    response_model=list[datetime],
+    dependencies=[Depends(rate_limit.limit_available_slots)],
+)
 def get_available_slots_for_department(
     department_id: int,
     date_str: str = Query(..., description="Date in YYYY-MM-DD format"), # Require date
@@ -138,8 +202,58 @@ def get_available_slots_for_department(
     return available_slots 
 
 # Создать запись (includes iin, service, and validation)
-@app.post("/appointments/", response_model=schemas.Appointment)
-def create_appointment(appointment: schemas.AppointmentCreate, db: Session = Depends(get_db)):
+@app.post(
+    "/appointments/",
+    response_model=schemas.Appointment,
+    dependencies=[Depends(rate_limit.limit_booking)],
+)
+def create_appointment(
+    appointment: schemas.AppointmentCreate,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    if idempotency_key is None:
+        return _create_appointment(appointment, db)
+
+    # Retries with the same key replay the first result: from this worker's
+    # memory if possible, otherwise from the idempotency_keys table
+    fingerprint = appointment.model_dump_json()
+    stored = idempotency.store.begin(idempotency_key, fingerprint)
+    if stored is not None:
+        return stored.replay()
+
+    try:
+        result = _create_appointment_once(appointment, db, idempotency_key, fingerprint)
+    except idempotency.KeyReuseError:
+        idempotency.store.abandon(idempotency_key)
+        raise
+    except HTTPException as exc:
+        idempotency.store.complete(idempotency_key, exc.status_code, exc.detail)
+        raise
+    except Exception:
+        idempotency.store.abandon(idempotency_key)
+        raise
+    idempotency.store.complete(idempotency_key, status.HTTP_200_OK, result)
+    return result
+
+def _create_appointment_once(appointment: schemas.AppointmentCreate, db: Session,
+                             idempotency_key: str, fingerprint: str):
+    record = crud.get_idempotency_record(db, idempotency_key)
+    if record is None:
+        try:
+            return schemas.Appointment.model_validate(
+                _create_appointment(appointment, db, idempotency_key, fingerprint)
+            )
+        except HTTPException as exc:
+            # A concurrent retry (possibly on another worker) may have booked
+            # the slot with this key first; otherwise this error is the result
+            record = crud.get_idempotency_record(db, idempotency_key)
+            if record is None:
+                record = crud.save_idempotency_error(db, idempotency_key, fingerprint, exc.status_code, exc.detail)
+    return idempotency.replay_record(record, fingerprint)
+
+def _create_appointment(appointment: schemas.AppointmentCreate, db: Session,
+                        idempotency_key: Optional[str] = None, fingerprint: Optional[str] = None):
     # Fetch department to check its type and existence
     department = crud.get_department_by_id(db, appointment.department_id)
     if not department:
@@ -150,22 +264,17 @@ def create_appointment(appointment: schemas.AppointmentCreate, db: Session = Dep
         raise HTTPException(status_code=400, detail="Записаться можно только с 9:00 утра до 18:00")
 
     # Validate selected service based on department type
-    allowed_services = crud.get_services_for_department(db, appointment.department_id)
+    allowed_services = crud.get_services_for(department)
     if appointment.service not in allowed_services:
         raise HTTPException(status_code=400, detail=f"Неверная услуга '{appointment.service}' для данного отделения.")
 
     # Check if slot is already booked
-    existing = db.query(models.Appointment).filter(
-        models.Appointment.time_slot == appointment.time_slot,
-        models.Appointment.department_id == appointment.department_id
-    ).first()
-
-    if existing:
+    if crud.is_slot_booked(db, appointment.department_id, appointment.time_slot):
         raise HTTPException(status_code=400, detail="Это время уже занято")
 
     # Create new appointment
     try:
-        return crud.create_appointment(db, appointment)
+        return crud.create_appointment(db, appointment, idempotency_key, fingerprint)
     except sqlalchemy.exc.IntegrityError:
         # This handles race conditions when two users book the same slot simultaneously
         db.rollback()
@@ -173,7 +282,7 @@ def create_appointment(appointment: schemas.AppointmentCreate, db: Session = Dep
 
 # Endpoint для получения JWT токена
 @app.post("/token")
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     if form_data.username != settings.ADMIN_USERNAME or form_data.password != settings.ADMIN_PASSWORD:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -186,9 +295,25 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+# Выход: токен больше не принимается
+@app.post("/logout")
+def logout(token: str = Depends(oauth2_scheme), current_admin: str = Depends(get_current_admin)):
+    revoke_token(token)
+    return {"detail": "Вы вышли из системы"}
+
+# Отозвать все выданные токены (например, после смены пароля)
+@app.post("/admin/revoke-tokens/")
+def revoke_tokens(current_admin: str = Depends(get_current_admin)):
+    revoke_all_tokens()
+    return {"detail": "Все токены отозваны"}
+
 # Защищенная админ-панель со статистикой
 @app.get("/admin/statistics/")
-def get_statistics(db: Session = Depends(get_db), current_admin: str = Depends(get_current_admin)):
+def get_statistics(db: Session = Depends(get_read_db), current_admin: str = Depends(get_current_admin)):
+    # Served from memory until the next booking (or the next day)
+    return response_cache.admin_cache.get_or_compute("statistics", (), lambda: _compute_statistics(db))
+
+def _compute_statistics(db: Session):
     appointments = db.query(models.Appointment).all()
     departments = db.query(models.Department).all()
     
@@ -208,7 +333,10 @@ def get_statistics(db: Session = Depends(get_db), current_admin: str = Depends(g
 
 # New dashboard statistics endpoint
 @app.get("/admin/dashboard-statistics/general/")
-def get_dashboard_statistics(db: Session = Depends(get_db), current_admin: str = Depends(get_current_admin)):
+def get_dashboard_statistics(db: Session = Depends(get_read_db), current_admin: str = Depends(get_current_admin)):
+    return response_cache.admin_cache.get_or_compute("dashboard-general", (), lambda: _compute_dashboard_statistics(db))
+
+def _compute_dashboard_statistics(db: Session):
     # Get current date
     now = datetime.now()
     today = now.date()
@@ -238,8 +366,8 @@ def get_dashboard_statistics(db: Session = Depends(get_db), current_admin: str =
     ).count()
 
     # Calculate load percentage
-    # We'll consider 8 slots per day (9:00-17:00, 1 hour each) as 100% capacity
-    slots_per_day = 8
+    # Every working slot of every department counts as 100% capacity
+    slots_per_day = len(datetime_utils.get_working_slots_for_date(today))
     total_possible_slots = len(departments) * slots_per_day
     if total_possible_slots > 0:
         load_percentage = (todays_appointments / total_possible_slots) * 100
@@ -256,10 +384,32 @@ def get_dashboard_statistics(db: Session = Depends(get_db), current_admin: str =
         "load_percentage": round(load_percentage, 1)
     }
 
+# Occupancy heatmap: department × weekday × slot over a date range
+@app.get("/admin/analytics/load-heatmap/")
+def get_load_heatmap(
+    date_from: str = Query(..., description="Start date (YYYY-MM-DD), inclusive"),
+    date_to: str = Query(..., description="End date (YYYY-MM-DD), inclusive"),
+    department_id: Optional[int] = Query(None, description="Limit to one department"),
+    db: Session = Depends(get_read_db),
+    current_admin: str = Depends(get_current_admin)
+):
+    try:
+        start_date = datetime_utils.parse_date(date_from)
+        end_date = datetime_utils.parse_date(date_to)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный формат даты. Используйте YYYY-MM-DD.")
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="Начальная дата должна быть не позже конечной.")
+
+    # numpy is only needed here, so the analytics module is imported on first use
+    import analytics
+
+    return analytics.get_load_heatmap(db, start_date, end_date, department_id)
+
 # Get all appointments (admin only, with date filtering and new fields)
 @app.get("/admin/appointments/", response_model=list[schemas.AppointmentResponse])
 def get_all_appointments(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_admin: str = Depends(get_current_admin),
     filter_date_str: Optional[str] = Query(None, description="Filter by date (YYYY-MM-DD)")
 ):
@@ -300,9 +450,12 @@ def get_all_appointments(
 # Get all branches (admin only, includes is_special)
 @app.get("/admin/branches/", response_model=list[schemas.DepartmentWithStats])
 def get_all_branches(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_admin: str = Depends(get_current_admin),
 ):
+    return response_cache.admin_cache.get_or_compute("branches", (), lambda: _compute_branches(db))
+
+def _compute_branches(db: Session):
     # Get current date
     today = datetime.now().date()
     today_start, today_end = datetime_utils.get_date_range_bounds(today)
@@ -329,6 +482,8 @@ def get_all_branches(
             "name": branch.name,
             "address": branch.address,
             "is_special": branch.is_special,
+            "latitude": branch.latitude,
+            "longitude": branch.longitude,
             "total_appointments": total_appointments,
             "today_appointments": today_appointments
         }
@@ -339,125 +494,29 @@ def get_all_branches(
 # Export route for generating PDF report (includes iin and service)
 @app.get("/admin/export/")
 def export_data(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_admin: str = Depends(get_current_admin)
 ):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=letter,
-        rightMargin=72,
-        leftMargin=72,
-        topMargin=72,
-        bottomMargin=72
-    )
+    # ReportLab is heavy, so the PDF module is only imported on first export
+    import pdf_export
 
-    elements = []
-    styles = get_custom_styles()
     current_time = datetime.now()
+    today = current_time.date()
+    today_start, today_end = datetime_utils.get_date_range_bounds(today)
 
-    # Add Title and Date
-    elements.append(Paragraph('ЦОН - Экспорт данных', styles['CustomTitle']))
-    elements.append(Spacer(1, 10)) # Reduced spacer
-    elements.append(Paragraph(f'Дата отчета: {current_time.strftime("%Y-%m-%d %H:%M:%S")}', styles['CustomNormal']))
-    elements.append(Spacer(1, 20))
-
-    # --- Branches Section ---
-    elements.append(Paragraph('Отделения', styles['CustomHeading1']))
-    elements.append(Spacer(1, 12))
-
-    branches = db.query(models.Department).all()
-    if branches:
-        # Header row for branches
-        branch_data = [['ID', 'Название', 'Тип', 'Адрес', 'Всего записей', 'Записей сегодня']]
-        today = current_time.date()
-        today_start, today_end = datetime_utils.get_date_range_bounds(today)
-
-        for branch in branches:
-            total_appts = db.query(func.count(models.Appointment.id)).filter(models.Appointment.department_id == branch.id).scalar() or 0
-            today_appts = db.query(func.count(models.Appointment.id)).filter(
-                models.Appointment.department_id == branch.id,
-                models.Appointment.time_slot >= today_start,
-                models.Appointment.time_slot < today_end
-            ).scalar() or 0
-
-            branch_data.append([
-                str(branch.id),
-                Paragraph(branch.name, styles['CustomNormal']), # Wrap long names
-                "СпецЦОН" if branch.is_special else "Обычный ЦОН",
-                Paragraph(branch.address, styles['CustomNormal']), # Wrap long addresses
-                str(total_appts),
-                str(today_appts)
-            ])
-
-        # Create branch table with adjusted column widths
-        branch_table = Table(branch_data, colWidths=[30, 140, 80, 150, 50, 50]) # Adjust widths as needed
-        branch_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'), # Vertical align
-            ('FONTNAME', (0, 0), (-1, 0), 'ArialUnicodeMS'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12), # Smaller header
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('FONTNAME', (0, 1), (-1, -1), 'ArialUnicodeMS'), # Ensure font for data too
-            ('FONTSIZE', (0, 1), (-1, -1), 10), # Smaller data font
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            # Alignment for specific columns if needed
-            ('ALIGN', (1, 1), (1, -1), 'LEFT'), # Align names left
-            ('ALIGN', (3, 1), (3, -1), 'LEFT'), # Align addresses left
-        ]))
-        elements.append(branch_table)
-
-    elements.append(Spacer(1, 30))
-
-    # --- Appointments Section ---
-    elements.append(Paragraph('Записи', styles['CustomHeading1']))
-    elements.append(Spacer(1, 12))
+    branches = []
+    for branch in db.query(models.Department).all():
+        total_appts = db.query(func.count(models.Appointment.id)).filter(models.Appointment.department_id == branch.id).scalar() or 0
+        today_appts = db.query(func.count(models.Appointment.id)).filter(
+            models.Appointment.department_id == branch.id,
+            models.Appointment.time_slot >= today_start,
+            models.Appointment.time_slot < today_end
+        ).scalar() or 0
+        branches.append((branch, total_appts, today_appts))
 
     appointments = db.query(models.Appointment).join(models.Department).order_by(models.Appointment.id.asc()).all()
-    if appointments:
-        # Header row for appointments - Added IIN and Service
-        appointment_data = [['ID', 'Отделение', 'Дата и время', 'ИИН', 'Имя', 'Телефон', 'Услуга']]
-
-        for appt in appointments:
-            appointment_data.append([
-                str(appt.id),
-                Paragraph(appt.department.name, styles['CustomNormal']), # Wrap
-                appt.time_slot.strftime("%Y-%m-%d %H:%M"),
-                appt.iin, # Added IIN
-                Paragraph(appt.user_name or "Н/Д", styles['CustomNormal']), # Wrap
-                appt.phone_number or "Н/Д",
-                Paragraph(appt.service, styles['CustomNormal']) # Added Service, wrap
-            ])
-
-        # Create the appointments table with adjusted column widths
-        appt_table = Table(appointment_data, colWidths=[30, 100, 100, 90, 80, 80, 100]) # Adjust widths
-        appt_table.setStyle(TableStyle([
-           ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'), # Vertical align
-            ('FONTNAME', (0, 0), (-1, 0), 'ArialUnicodeMS'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11), # Smaller header
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('FONTNAME', (0, 1), (-1, -1), 'ArialUnicodeMS'), # Ensure font for data
-            ('FONTSIZE', (0, 1), (-1, -1), 9), # Smaller data font
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-             # Alignment for specific columns
-            ('ALIGN', (1, 1), (1, -1), 'LEFT'), # Dept Name
-            ('ALIGN', (4, 1), (4, -1), 'LEFT'), # User Name
-            ('ALIGN', (6, 1), (6, -1), 'LEFT'), # Service
-        ]))
-        elements.append(appt_table)
-
-    # Build PDF document
-    doc.build(elements)
-    buffer.seek(0)
+
+    buffer = pdf_export.build_report(branches, appointments, current_time)
 
     # Return the PDF
     return StreamingResponse(
@@ -0,0 +1,155 @@
+import logging
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+# Schema changes for databases created by older versions. Each migration
+# inspects the current schema and is a no-op when it is already up to date,
+# so it is also safe on fresh databases built by create_all.
+
+def _column_type(connection: Connection, table: str, column: str):
+    for row in connection.exec_driver_sql(f"PRAGMA table_info({table})"):
+        if row[1] == column:
+            return row[2].upper()
+    return None
+
+def _table_exists(connection: Connection, table: str) -> bool:
+    return connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).first() is not None
+
+def _time_slot_to_integer(connection: Connection):
+    """appointments.time_slot: DATETIME text -> minutes since 1970-01-01."""
+    import models
+
+    if _table_exists(connection, "appointments_old"):
+        # Left behind by a run that crashed before migrations were
+        # transactional: the bookings are still there, so finish the copy
+        logger.warning("Resuming the time_slot migration from appointments_old")
+    elif _column_type(connection, "appointments", "time_slot") in (None, "INTEGER"):
+        return
+    else:
+        logger.info("Migrating appointments.time_slot to integer minutes")
+        # Keep foreign keys in other tables pointing at "appointments" while renaming
+        connection.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+        connection.exec_driver_sql("ALTER TABLE appointments RENAME TO appointments_old")
+        connection.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+
+    # Index names are global in SQLite, so drop the old ones before recreating
+    for row in connection.exec_driver_sql("PRAGMA index_list(appointments_old)").fetchall():
+        if row[3] == "c":  # created by CREATE INDEX, not by a constraint
+            connection.exec_driver_sql(f'DROP INDEX "{row[1]}"')
+    models.Appointment.__table__.create(bind=connection, checkfirst=True)
+
+    # Whole minutes, rounded down like datetime_utils.to_slot_minutes (integer
+    # seconds from strftime, so there is no floating point error on the boundary).
+    # id_taken is only set when resuming, for ids reused by bookings made since
+    connection.exec_driver_sql(
+        "CREATE TEMP TABLE appointments_minutes AS "
+        "SELECT id, department_id, CAST(strftime('%s', time_slot) AS INTEGER) / 60 AS time_slot, "
+        "id IN (SELECT id FROM appointments) AS id_taken "
+        "FROM appointments_old"
+    )
+    # The old column allowed seconds, so two bookings can fall into the same
+    # minute (or, when resuming, onto a booking made since): the lowest id
+    # keeps the slot, the others are moved aside unchanged for manual review
+    conflicts = [row[0] for row in connection.exec_driver_sql(
+        "SELECT m.id FROM appointments_minutes m WHERE EXISTS ("
+        "  SELECT 1 FROM appointments_minutes o WHERE o.department_id = m.department_id"
+        "  AND o.time_slot = m.time_slot AND o.id < m.id"
+        ") OR EXISTS ("
+        "  SELECT 1 FROM appointments a WHERE a.department_id = m.department_id AND a.time_slot = m.time_slot"
+        ") ORDER BY m.id"
+    )]
+    if conflicts:
+        logger.warning("Appointments %s share a department and minute with another booking, "
+                       "moved to appointments_conflicts", conflicts)
+        ids = ", ".join(map(str, conflicts))
+        if not _table_exists(connection, "appointments_conflicts"):
+            connection.exec_driver_sql("CREATE TABLE appointments_conflicts AS SELECT * FROM appointments_old WHERE 0")
+        connection.exec_driver_sql(f"INSERT INTO appointments_conflicts SELECT * FROM appointments_old WHERE id IN ({ids})")
+        connection.exec_driver_sql(f"DELETE FROM appointments_minutes WHERE id IN ({ids})")
+
+    for id_taken in (0, 1):
+        # Rows with a taken id get a new one (NULL), after the others kept theirs
+        copied = connection.exec_driver_sql(
+            "INSERT INTO appointments (id, department_id, time_slot, user_name, phone_number, iin, service, status) "
+            f"SELECT {'NULL' if id_taken else 'm.id'}, m.department_id, m.time_slot, "
+            "o.user_name, o.phone_number, o.iin, o.service, o.status "
+            "FROM appointments_minutes m JOIN appointments_old o ON o.id = m.id "
+            "WHERE m.id_taken = ? ORDER BY m.id",
+            (id_taken,),
+        ).rowcount
+        if id_taken and copied:
+            logger.warning("%d resumed appointments got new ids", copied)
+    connection.exec_driver_sql("DROP TABLE appointments_minutes")
+    connection.exec_driver_sql("DROP TABLE appointments_old")
+
+def _department_coordinates(connection: Connection):
+    """departments.latitude / longitude for the nearest-branch search."""
+    for column in ("latitude", "longitude"):
+        if _column_type(connection, "departments", column) is None:
+            connection.exec_driver_sql(f"ALTER TABLE departments ADD COLUMN {column} FLOAT")
+
+# Coordinates of the branches shipped in tson-queue.db (same as mock-data.py)
+DEPARTMENT_COORDINATES = {
+    "СпецЦОН №1 (Сарыарка)": (51.1833, 71.4056),
+    "ЦОН района Алматы": (51.1472, 71.4706),
+    "ЦОН района Есиль": (51.0906, 71.4182),
+    "ЦОН района Байконур": (51.1712, 71.4331),
+    "ЦОН района Нура": (51.1283, 71.4303),
+}
+
+def _department_coordinates_backfill(connection: Connection):
+    """Fill in coordinates of known branches, which _department_coordinates left empty."""
+    for name, (latitude, longitude) in DEPARTMENT_COORDINATES.items():
+        connection.exec_driver_sql(
+            "UPDATE departments SET latitude = ?, longitude = ? "
+            "WHERE name = ? AND latitude IS NULL AND longitude IS NULL",
+            (latitude, longitude, name),
+        )
+
+def _cache_invalidation_scope(connection: Connection):
+    """cache_invalidations.scope, so token revocations use the same channel."""
+    if _column_type(connection, "cache_invalidations", "scope") is None:
+        connection.exec_driver_sql("ALTER TABLE cache_invalidations ADD COLUMN scope VARCHAR")
+
+def _cache_invalidation_autoincrement(connection: Connection):
+    """cache_invalidations.id: AUTOINCREMENT, so pruned ids are never reused."""
+    import models
+
+    sql = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'cache_invalidations'"
+    ).scalar()
+    if sql is None or "AUTOINCREMENT" in sql.upper():
+        return
+    connection.exec_driver_sql("ALTER TABLE cache_invalidations RENAME TO cache_invalidations_old")
+    models.CacheInvalidation.__table__.create(bind=connection)
+    # Explicit ids also advance sqlite_sequence past the highest copied one
+    connection.exec_driver_sql(
+        "INSERT INTO cache_invalidations (id, scope, department_id, day, created_at) "
+        "SELECT id, scope, department_id, day, created_at FROM cache_invalidations_old"
+    )
+    connection.exec_driver_sql("DROP TABLE cache_invalidations_old")
+
+MIGRATIONS = [
+    _time_slot_to_integer,
+    _department_coordinates,
+    _cache_invalidation_scope,
+    _cache_invalidation_autoincrement,
+    _department_coordinates_backfill,
+]
+
+def upgrade(connection: Connection):
+    """Apply migrations newer than the database's PRAGMA user_version."""
+    # pysqlite only opens a transaction before INSERT/UPDATE/DELETE and runs
+    # ALTER/CREATE/DROP in autocommit mode, so begin explicitly: a failing
+    # migration then rolls back as a whole instead of leaving half a schema
+    connection.exec_driver_sql("BEGIN")
+    version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+    if version >= 1 and _table_exists(connection, "appointments_old"):
+        _time_slot_to_integer(connection)
+    for number, migration in enumerate(MIGRATIONS, start=1):
+        if number > version:
+            migration(connection)
+            connection.exec_driver_sql(f"PRAGMA user_version = {number}")
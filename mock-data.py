@@ -4,6 +4,7 @@ from faker import Faker
 from datetime import datetime, timedelta, time
 import random
 import datetime_utils
+import cache_sync
 from config import settings
 
 # Initialize Faker
@@ -40,27 +41,37 @@ departments_data = [
     {
         "name": "СпецЦОН №1 (Сарыарка)", # Marked as special
         "address": "г. Астана, район Сарыарка, ул. №20-40, здание 2",
-        "is_special": True
+        "is_special": True,
+        "latitude": 51.1833,
+        "longitude": 71.4056
     },
     {
         "name": "ЦОН района Алматы",
         "address": "г. Астана, район Алматы, ул. К. Сатпаева, 25",
-        "is_special": False
+        "is_special": False,
+        "latitude": 51.1472,
+        "longitude": 71.4706
     },
     {
         "name": "ЦОН района Есиль",
         "address": "г. Астана, район Есиль, ул. Мангилик Ел, 30",
-        "is_special": False
+        "is_special": False,
+        "latitude": 51.0906,
+        "longitude": 71.4182
     },
     {
         "name": "ЦОН района Байконур",
         "address": "г. Астана, район Байконур, ул. Иманова, 20/1",
-        "is_special": False
+        "is_special": False,
+        "latitude": 51.1712,
+        "longitude": 71.4331
     },
      {
         "name": "ЦОН района Нура",
         "address": "г. Астана, район Нура, проспект Кабанбай батыра, 6/3",
-        "is_special": False
+        "is_special": False,
+        "latitude": 51.1283,
+        "longitude": 71.4303
     }
 ]
 
@@ -133,6 +144,10 @@ while current_day <= end_date:
 
     current_day += timedelta(days=1) # Move to the next day
 
+# Tell running workers that departments and appointments were replaced
+# (drops their department index and cached statistics)
+cache_sync.record_write(db)
+
 print(f"Committing {appointment_count} appointments...")
 db.commit()
 db.close()
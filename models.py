@@ -1,19 +1,41 @@
 import pytz
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, UniqueConstraint, ForeignKey
+from sqlalchemy import Column, Integer, Float, String, DateTime, Date, Boolean, UniqueConstraint, ForeignKey, Index
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 from datetime import datetime
+import datetime_utils
 
 # Define Almaty timezone
 almaty_tz = pytz.timezone('Asia/Almaty')
 
+class SlotTime(TypeDecorator):
+    """
+    Naive datetime stored as an integer number of minutes since 1970-01-01,
+    so range filters, uniqueness checks and indexes work on small integers.
+    """
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        return datetime_utils.to_slot_minutes(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return datetime_utils.from_slot_minutes(value)
+
 class Department(Base):
     __tablename__ = "departments"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     address = Column(String)
     is_special = Column(Boolean, default=False) # Added field to distinguish Special TSON
+    latitude = Column(Float)  # Used by the nearest-branch search (geo_index)
+    longitude = Column(Float)
     
     appointments = relationship("Appointment", back_populates="department")
 
@@ -21,11 +43,11 @@ class Appointment(Base):
     __tablename__ = "appointments"
     id = Column(Integer, primary_key=True, index=True)
     department_id = Column(Integer, ForeignKey("departments.id"))
-    # Store datetime without timezone info for simplicity
-    time_slot = Column(DateTime, index=True)
+    # Naive local datetime, stored as minutes since epoch (see SlotTime)
+    time_slot = Column(SlotTime, index=True)
     user_name = Column(String, index=True)
     phone_number = Column(String)
-    iin = Column(String, index=True, nullable=False)
+    iin = Column(String, nullable=False)  # Indexed together with time_slot below
     service = Column(String, nullable=False)
     status = Column(String, default="active")  # possible values: active, cancelled
     
@@ -33,6 +55,8 @@ class Appointment(Base):
     
     __table_args__ = (
         UniqueConstraint('department_id', 'time_slot', name='uix_department_timeslot'),
+        # Citizen lookup: upcoming appointments by IIN, ordered by time
+        Index('ix_appointments_iin_time_slot', 'iin', 'time_slot'),
     )
 
     # Set default timestamp with Almaty timezone
@@ -46,4 +70,75 @@ class Appointment(Base):
     #         self.time_slot = almaty_tz.localize(self.time_slot).astimezone(pytz.utc)
     #     elif self.time_slot:
     #         # Ensure it's UTC if timezone is already provided
-    #         self.time_slot = self.time_slot.astimezone(pytz.utc)
\ No newline at end of file
+    #         self.time_slot = self.time_slot.astimezone(pytz.utc)
+
+class NotificationOutbox(Base):
+    """Booking confirmations waiting to be sent; survives restarts."""
+    __tablename__ = "notification_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=False)
+    channel = Column(String, nullable=False, default="sms")
+    recipient = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # possible values: pending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.now)
+    last_error = Column(String)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    appointment = relationship("Appointment")
+
+    __table_args__ = (
+        Index('ix_notification_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+class CacheInvalidation(Base):
+    """
+    Write log polled by every worker process to drop stale in-memory cache
+    entries. NULL department_id / day mean "all departments" / "all days".
+    """
+    __tablename__ = "cache_invalidations"
+    id = Column(Integer, primary_key=True)
+    scope = Column(String, default="data")  # cache_sync.DATA or cache_sync.AUTH
+    department_id = Column(Integer)
+    day = Column(Date)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    # Never reuse ids of pruned rows: workers read everything above the last id they saw
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class CacheSyncState(Base):
+    """
+    Single row holding a random generation. It disappears when the tables are
+    dropped and recreated, so workers notice that invalidation ids started over.
+    """
+    __tablename__ = "cache_sync_state"
+    id = Column(Integer, primary_key=True)
+    generation = Column(String, nullable=False)
+
+class IdempotencyRecord(Base):
+    """
+    First result of a POST /appointments/ request per Idempotency-Key,
+    shared by all workers. Success rows are written in the booking
+    transaction and point at the appointment; error rows keep the detail.
+    """
+    __tablename__ = "idempotency_keys"
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=False)
+    appointment_id = Column(Integer, ForeignKey("appointments.id"))
+    error_detail = Column(String)
+    created_at = Column(DateTime, nullable=False, default=datetime.now, index=True)
+
+    appointment = relationship("Appointment")
+
+class RevokedToken(Base):
+    """Logged-out admin tokens (by SHA-256 digest), kept until they expire."""
+    __tablename__ = "revoked_tokens"
+    digest = Column(String, primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class AuthState(Base):
+    """Single row (id=1); tokens issued with an older generation are rejected."""
+    __tablename__ = "auth_state"
+    id = Column(Integer, primary_key=True)
+    token_generation = Column(Integer, nullable=False, default=0)
\ No newline at end of file
@@ -0,0 +1,240 @@
+import abc
+import asyncio
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.orm import joinedload
+import models
+from database import SessionLocal
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class Message:
+    __slots__ = ("id", "channel", "recipient", "text")
+
+    def __init__(self, id: int, channel: str, recipient: str, text: str):
+        self.id = id
+        self.channel = channel
+        self.recipient = recipient
+        self.text = text
+
+# --- Transports ---
+class Transport(abc.ABC):
+    """
+    Delivers a batch of messages. Raising an exception marks the whole batch
+    as failed, and it is retried with backoff.
+    """
+
+    @abc.abstractmethod
+    def send_batch(self, messages: list[Message]):
+        ...
+
+class FileTransport(Transport):
+    """Appends messages as JSON lines to a local file (for development and tests)."""
+
+    def __init__(self, path: str = settings.NOTIFICATION_FILE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages: list[Message]):
+        lines = "".join(
+            json.dumps({
+                "id": message.id,
+                "channel": message.channel,
+                "recipient": message.recipient,
+                "text": message.text,
+                "sent_at": datetime.now().isoformat(),
+            }, ensure_ascii=False) + "\n"
+            for message in messages
+        )
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+class LogTransport(Transport):
+    def send_batch(self, messages: list[Message]):
+        for message in messages:
+            logger.info("Notification %s to %s via %s: %s", message.id, message.recipient, message.channel, message.text)
+
+TRANSPORTS = {
+    "file": FileTransport,
+    "log": LogTransport,
+}
+
+_transport: Optional[Transport] = None
+
+def get_transport() -> Transport:
+    global _transport
+    if _transport is None:
+        _transport = TRANSPORTS[settings.NOTIFICATION_TRANSPORT]()
+    return _transport
+
+def set_transport(transport: Transport):
+    """Plug in a real SMS/e-mail gateway."""
+    global _transport
+    _transport = transport
+
+# --- Outbox ---
+def add_booking_confirmation(db, appointment: models.Appointment) -> Optional[models.NotificationOutbox]:
+    """
+    Add an outbox row in the caller's transaction; enqueue() it after commit.
+    Returns None when notifications are disabled.
+    """
+    if not settings.NOTIFICATIONS_ENABLED:
+        return None
+    outbox = models.NotificationOutbox(
+        appointment=appointment,
+        channel="sms",
+        recipient=appointment.phone_number,
+    )
+    db.add(outbox)
+    return outbox
+
+def format_confirmation(appointment: models.Appointment) -> str:
+    return (
+        f"Вы записаны в {appointment.department.name} ({appointment.department.address}) "
+        f"на {appointment.time_slot.strftime('%d.%m.%Y %H:%M')}. Услуга: {appointment.service}. "
+        f"Номер записи: {appointment.id}."
+    )
+
+def _claim(db, ids: list[int], now: datetime) -> list[models.NotificationOutbox]:
+    """
+    Lease due pending rows so that other workers (or processes) skip them.
+    A lease that is never finished expires and the row is picked up again.
+    """
+    lease_until = now + timedelta(seconds=settings.NOTIFICATION_LEASE_SECONDS)
+    claimed = []
+    for outbox_id in ids:
+        updated = db.query(models.NotificationOutbox).filter(
+            models.NotificationOutbox.id == outbox_id,
+            models.NotificationOutbox.status == "pending",
+            models.NotificationOutbox.next_attempt_at <= now
+        ).update({"next_attempt_at": lease_until}, synchronize_session=False)
+        if updated:
+            claimed.append(outbox_id)
+    db.commit()
+    if not claimed:
+        return []
+    return db.query(models.NotificationOutbox).options(
+        joinedload(models.NotificationOutbox.appointment).joinedload(models.Appointment.department)
+    ).filter(models.NotificationOutbox.id.in_(claimed)).all()
+
+def _process_batch(ids: list[int]) -> list[tuple[int, float]]:
+    """
+    Send one batch (runs in a thread). Returns (id, delay_seconds) pairs
+    of jobs to retry.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        rows = _claim(db, ids, now)
+        if not rows:
+            return []
+
+        messages = [Message(row.id, row.channel, row.recipient, format_confirmation(row.appointment)) for row in rows]
+        try:
+            get_transport().send_batch(messages)
+            error = None
+        except Exception as exc:
+            logger.warning("Notification batch of %d failed: %s", len(messages), exc)
+            error = str(exc)
+
+        retries = []
+        for row in rows:
+            row.attempts += 1
+            if error is None:
+                row.status = "sent"
+                row.last_error = None
+            elif row.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                row.status = "failed"
+                row.last_error = error
+            else:
+                delay = settings.NOTIFICATION_RETRY_BASE_SECONDS * 2 ** (row.attempts - 1)
+                row.next_attempt_at = now + timedelta(seconds=delay)
+                row.last_error = error
+                retries.append((row.id, delay))
+        db.commit()
+        return retries
+    finally:
+        db.close()
+
+def _due_pending_ids(limit: int) -> list[int]:
+    db = SessionLocal()
+    try:
+        rows = db.query(models.NotificationOutbox.id).filter(
+            models.NotificationOutbox.status == "pending",
+            models.NotificationOutbox.next_attempt_at <= datetime.now()
+        ).order_by(models.NotificationOutbox.next_attempt_at.asc()).limit(limit).all()
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+# --- In-process queue ---
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_queue: Optional[asyncio.Queue] = None
+_tasks: list[asyncio.Task] = []
+
+def enqueue(outbox_id: int):
+    """
+    Hand a committed outbox row to the workers. Safe to call from the
+    threadpool that runs sync endpoints; a no-op when the workers aren't
+    running (the row is picked up by the next outbox scan instead).
+    """
+    if _loop is None or _queue is None or _loop.is_closed():
+        return
+    _loop.call_soon_threadsafe(_queue.put_nowait, outbox_id)
+
+async def _worker():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _queue.get()]
+        deadline = loop.time() + settings.NOTIFICATION_BATCH_WAIT_SECONDS
+        while len(batch) < settings.NOTIFICATION_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            retries = await loop.run_in_executor(None, _process_batch, batch)
+        except Exception:
+            # Claimed rows come back after their lease expires
+            logger.exception("Failed to process notification batch")
+            continue
+        for outbox_id, delay in retries:
+            loop.call_later(delay, _queue.put_nowait, outbox_id)
+
+async def _poll_outbox():
+    # Picks up jobs queued before a restart and ones whose lease expired
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            ids = await loop.run_in_executor(None, _due_pending_ids, settings.NOTIFICATION_BATCH_SIZE * 10)
+            for outbox_id in ids:
+                _queue.put_nowait(outbox_id)
+        except Exception:
+            logger.exception("Failed to scan notification outbox")
+        await asyncio.sleep(settings.NOTIFICATION_POLL_SECONDS)
+
+async def start():
+    global _loop, _queue
+    if not settings.NOTIFICATIONS_ENABLED or _tasks:
+        return
+    _loop = asyncio.get_running_loop()
+    _queue = asyncio.Queue()
+    _tasks.extend(asyncio.create_task(_worker()) for _ in range(settings.NOTIFICATION_WORKERS))
+    _tasks.append(asyncio.create_task(_poll_outbox()))
+
+async def stop():
+    global _loop, _queue
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    _loop = None
+    _queue = None
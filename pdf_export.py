@@ -0,0 +1,163 @@
+from functools import lru_cache
+from io import BytesIO
+from datetime import datetime
+
+# This module is imported lazily from the export route, so ReportLab is only
+# loaded by workers that actually generate a report.
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+FONT_NAME = 'ArialUnicodeMS'
+FONT_PATH = 'fonts/ArialUnicodeMS.ttf'
+
+@lru_cache(maxsize=None)
+def register_fonts():
+    # Parsing the TTF file is expensive, so do it once per process
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+    # pdfmetrics.registerFont(TTFont('ArialUnicodeMS-Bold', 'fonts/ArialUnicodeMS-Bold.ttf'))
+
+# Create custom styles with Cyrillic support (built once and reused between exports)
+@lru_cache(maxsize=None)
+def get_custom_styles():
+    register_fonts()
+    styles = getSampleStyleSheet()
+    # Create custom styles with Cyrillic font
+    styles.add(ParagraphStyle(
+        name='CustomTitle',
+        parent=styles['Title'],
+        fontName=FONT_NAME,
+        fontSize=24,
+        spaceAfter=30
+    ))
+    styles.add(ParagraphStyle(
+        name='CustomHeading1',
+        parent=styles['Heading1'],
+        fontName=FONT_NAME,
+        fontSize=18,
+        spaceAfter=20
+    ))
+    styles.add(ParagraphStyle(
+        name='CustomNormal',
+        parent=styles['Normal'],
+        fontName=FONT_NAME,
+        fontSize=12,
+        spaceAfter=12
+    ))
+    return styles
+
+def build_report(branches, appointments, current_time: datetime) -> BytesIO:
+    """
+    Render the admin export PDF.
+
+    `branches` is a list of (department, total_appointments, today_appointments)
+    tuples, `appointments` a list of appointments with their department loaded.
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=letter,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=72
+    )
+
+    elements = []
+    styles = get_custom_styles()
+
+    # Add Title and Date
+    elements.append(Paragraph('ЦОН - Экспорт данных', styles['CustomTitle']))
+    elements.append(Spacer(1, 10)) # Reduced spacer
+    elements.append(Paragraph(f'Дата отчета: {current_time.strftime("%Y-%m-%d %H:%M:%S")}', styles['CustomNormal']))
+    elements.append(Spacer(1, 20))
+
+    # --- Branches Section ---
+    elements.append(Paragraph('Отделения', styles['CustomHeading1']))
+    elements.append(Spacer(1, 12))
+
+    if branches:
+        # Header row for branches
+        branch_data = [['ID', 'Название', 'Тип', 'Адрес', 'Всего записей', 'Записей сегодня']]
+
+        for branch, total_appts, today_appts in branches:
+            branch_data.append([
+                str(branch.id),
+                Paragraph(branch.name, styles['CustomNormal']), # Wrap long names
+                "СпецЦОН" if branch.is_special else "Обычный ЦОН",
+                Paragraph(branch.address, styles['CustomNormal']), # Wrap long addresses
+                str(total_appts),
+                str(today_appts)
+            ])
+
+        # Create branch table with adjusted column widths
+        branch_table = Table(branch_data, colWidths=[30, 140, 80, 150, 50, 50]) # Adjust widths as needed
+        branch_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'), # Vertical align
+            ('FONTNAME', (0, 0), (-1, 0), FONT_NAME),
+            ('FONTSIZE', (0, 0), (-1, 0), 12), # Smaller header
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+            ('FONTNAME', (0, 1), (-1, -1), FONT_NAME), # Ensure font for data too
+            ('FONTSIZE', (0, 1), (-1, -1), 10), # Smaller data font
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            # Alignment for specific columns if needed
+            ('ALIGN', (1, 1), (1, -1), 'LEFT'), # Align names left
+            ('ALIGN', (3, 1), (3, -1), 'LEFT'), # Align addresses left
+        ]))
+        elements.append(branch_table)
+
+    elements.append(Spacer(1, 30))
+
+    # --- Appointments Section ---
+    elements.append(Paragraph('Записи', styles['CustomHeading1']))
+    elements.append(Spacer(1, 12))
+
+    if appointments:
+        # Header row for appointments - Added IIN and Service
+        appointment_data = [['ID', 'Отделение', 'Дата и время', 'ИИН', 'Имя', 'Телефон', 'Услуга']]
+
+        for appt in appointments:
+            appointment_data.append([
+                str(appt.id),
+                Paragraph(appt.department.name, styles['CustomNormal']), # Wrap
+                appt.time_slot.strftime("%Y-%m-%d %H:%M"),
+                appt.iin, # Added IIN
+                Paragraph(appt.user_name or "Н/Д", styles['CustomNormal']), # Wrap
+                appt.phone_number or "Н/Д",
+                Paragraph(appt.service, styles['CustomNormal']) # Added Service, wrap
+            ])
+
+        # Create the appointments table with adjusted column widths
+        appt_table = Table(appointment_data, colWidths=[30, 100, 100, 90, 80, 80, 100]) # Adjust widths
+        appt_table.setStyle(TableStyle([
+           ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'), # Vertical align
+            ('FONTNAME', (0, 0), (-1, 0), FONT_NAME),
+            ('FONTSIZE', (0, 0), (-1, 0), 11), # Smaller header
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+            ('FONTNAME', (0, 1), (-1, -1), FONT_NAME), # Ensure font for data
+            ('FONTSIZE', (0, 1), (-1, -1), 9), # Smaller data font
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+             # Alignment for specific columns
+            ('ALIGN', (1, 1), (1, -1), 'LEFT'), # Dept Name
+            ('ALIGN', (4, 1), (4, -1), 'LEFT'), # User Name
+            ('ALIGN', (6, 1), (6, -1), 'LEFT'), # Service
+        ]))
+        elements.append(appt_table)
+
+    # Build PDF document
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer
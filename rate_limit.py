@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from fastapi import HTTPException, Request, status
+from config import settings
+
+class TokenBucketStore:
+    """
+    Per-client token buckets kept in an LRU-ordered dict.
+
+    Each entry is a (tokens, last_seen) tuple. Idle entries are dropped and
+    the number of tracked clients is capped, so the store stays small even
+    when a flood comes from many addresses.
+    """
+
+    def __init__(self, rate_per_minute: int, burst: int,
+                 max_clients: int = settings.RATE_LIMIT_MAX_CLIENTS,
+                 idle_seconds: int = settings.RATE_LIMIT_IDLE_SECONDS):
+        self.rate = rate_per_minute / 60.0
+        self.burst = float(burst)
+        self.max_clients = max_clients
+        self.idle_seconds = idle_seconds
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        """
+        Take one token for `key`. Returns 0 if the request is allowed,
+        otherwise the number of seconds until a token becomes available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._buckets.pop(key, None)
+            if entry is None:
+                tokens = self.burst
+            else:
+                tokens, last_seen = entry
+                tokens = min(self.burst, tokens + (now - last_seen) * self.rate)
+
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate if self.rate > 0 else float(self.idle_seconds)
+
+            self._buckets[key] = (tokens, now)
+            self._evict(now)
+        return wait
+
+    def _evict(self, now: float):
+        # Oldest entries are at the front; drop idle ones, then enforce the cap
+        buckets = self._buckets
+        while buckets:
+            _, (_, last_seen) = next(iter(buckets.items()))
+            if now - last_seen < self.idle_seconds and len(buckets) <= self.max_clients:
+                break
+            buckets.popitem(last=False)
+
+    def __len__(self):
+        return len(self._buckets)
+
+booking_buckets = TokenBucketStore(settings.RATE_LIMIT_BOOKING_PER_MINUTE, settings.RATE_LIMIT_BOOKING_BURST)
+slots_buckets = TokenBucketStore(settings.RATE_LIMIT_SLOTS_PER_MINUTE, settings.RATE_LIMIT_SLOTS_BURST)
+
+# Global cap on bookings in flight, so a surge queues outside the database
+booking_semaphore = threading.BoundedSemaphore(settings.BOOKING_MAX_CONCURRENCY)
+
+def get_client_key(request: Request) -> str:
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        # Only the entries appended by our own proxies can be trusted: the
+        # client controls everything to their left, so count back from the right
+        forwarded = [entry.strip() for entry in request.headers.get("x-forwarded-for", "").split(",")]
+        hops = settings.RATE_LIMIT_PROXY_HOPS
+        if hops > 0 and len(forwarded) >= hops and forwarded[-hops]:
+            return forwarded[-hops]
+    return request.client.host if request.client else "unknown"
+
+def _check_rate(store: TokenBucketStore, request: Request):
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    wait = store.acquire(get_client_key(request))
+    if wait > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много запросов. Попробуйте позже.",
+            headers={"Retry-After": str(max(1, int(wait + 0.999)))},
+        )
+
+def limit_available_slots(request: Request):
+    """Dependency for the availability routes: per-client rate limit only."""
+    _check_rate(slots_buckets, request)
+
+def limit_booking(request: Request):
+    """
+    Dependency for POST /appointments/: per-client rate limit plus the global
+    concurrency cap. Rejects immediately instead of waiting for a free slot.
+    """
+    _check_rate(booking_buckets, request)
+    if not settings.RATE_LIMIT_ENABLED:
+        yield
+        return
+    if not booking_semaphore.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервис перегружен. Попробуйте позже.",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        yield
+    finally:
+        booking_semaphore.release()
@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Hashable
+import cache_sync
+
+# Bumped on every write that can change what the admin endpoints return
+_data_version = 0
+_version_lock = threading.Lock()
+
+def bump_data_version():
+    global _data_version
+    with _version_lock:
+        _data_version += 1
+
+def data_version() -> int:
+    return _data_version
+
+# Admin responses are global aggregates, so any write (local or from
+# another worker) invalidates them
+cache_sync.register(lambda department_id, day: bump_data_version())
+
+class ResponseCache:
+    """
+    LRU cache of computed responses keyed by (namespace, params).
+
+    An entry is only served while both the current date and the data
+    version are the ones it was computed for, so "today" statistics roll
+    over at midnight and any booking invalidates everything.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, namespace: str, params: Hashable, compute: Callable[[], Any]) -> Any:
+        key = (namespace, params)
+        stamp = (datetime.now().date(), data_version())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = (stamp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+admin_cache = ResponseCache()
@@ -7,6 +7,8 @@ class DepartmentBase(BaseModel):
     name: str
     address: str
     is_special: bool
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 class DepartmentCreate(DepartmentBase):
     pass
@@ -16,6 +18,9 @@ class Department(DepartmentBase):
     class Config:
         from_attributes = True
 
+class DepartmentWithDistance(Department):
+    distance_km: float
+
 class AppointmentBase(BaseModel):
     department_id: int
     time_slot: datetime
@@ -31,9 +36,18 @@ class AppointmentBase(BaseModel):
             return datetime_utils.parse_datetime(value)
         return value
 
+    @validator('time_slot')
+    def normalize_time_slot(cls, value):
+        """Convert offset-aware datetimes to naive local (Almaty) time"""
+        return datetime_utils.to_local_naive(value)
+
 class AppointmentCreate(AppointmentBase):
     pass
 
+class AppointmentLookup(BaseModel):
+    iin: str = Field(..., min_length=12, max_length=12, pattern=r'^\d{12}$')
+    phone_number: str
+
 class Appointment(AppointmentBase):
     id: int
     class Config:
@@ -57,5 +71,10 @@ class DepartmentWithStats(Department):
     class Config:
         from_attributes = True
 
+class BookedSlots(BaseModel):
+    department_id: int
+    slots: list[str]  # Start times of the working slots, e.g. "09:00"
+    booked: dict[str, int]  # Date (YYYY-MM-DD) -> bitmask, bit i set = slots[i] is booked
+
 class ServiceList(BaseModel):
     services: list[str]
\ No newline at end of file